@@ -2,13 +2,22 @@ import os
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
-from web3 import Web3
-import json
+from web3 import Web3, AsyncWeb3, AsyncHTTPProvider
+from hexbytes import HexBytes
+import aiohttp
+import orjson
 import asyncio
-from typing import Dict, List, Set
-import time
+import random
+from typing import Dict, List, Optional, Set, Tuple
 import logging
+import tempfile
 import datetime
+from collections import deque
+from urllib.parse import urlparse
+from token_metadata import (
+    MULTICALL3_ADDRESS, cache_token_info, decode_token_infos, encode_token_info_calls, get_cached_token_info,
+    mark_token_cache_dirty, restore_token_cache, snapshot_token_cache, to_checksum
+)
 
 # Configuration du logging
 logging.basicConfig(
@@ -18,13 +27,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Nombre de hash de transactions traitées gardés en mémoire (les plus anciens sont oubliés)
+PROCESSED_TXS_MAX = 10_000
+
+def write_file_atomic(filename: str, content: bytes):
+    """Écrit un fichier de manière atomique (fichier temporaire, fsync puis remplacement)"""
+    # Fichier temporaire unique puis remplacement : un crash pendant l'écriture ne corrompt pas les données,
+    # et deux écritures simultanées ne se mélangent pas dans un même fichier temporaire
+    directory, basename = os.path.split(os.path.abspath(filename))
+    fd, temp_filename = tempfile.mkstemp(dir=directory, prefix=f"{basename}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            # Forcer l'écriture sur disque avant le remplacement, sinon le rename peut précéder les données
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.unlink(temp_filename)
+        raise
+
 class DataManager:
     def __init__(self, filename='tracking_data.json'):
         self.filename = filename
         self.data = self.load_data()
         self.processed_txs = set()  # Cache des transactions traitées
+        self.processed_order = deque(maxlen=PROCESSED_TXS_MAX)  # Ordre d'insertion, pour l'éviction
         self.address_to_name = {}  # Mapping adresse -> nom
         self.name_to_address = {}  # Mapping nom -> adresse
+        self._save_handle = None  # Sauvegarde différée en attente
+        self._save_lock = None  # Créé dans la boucle asyncio au premier usage
+        self._dirty = False  # Modifications non encore écrites sur le disque
         self._init_mappings()
 
     def _init_mappings(self):
@@ -38,21 +71,45 @@ class DataManager:
         """Charge les données depuis le fichier JSON"""
         try:
             if os.path.exists(self.filename):
-                with open(self.filename, 'r') as f:
-                    return json.load(f)
+                with open(self.filename, 'rb') as f:
+                    return orjson.loads(f.read())
             return {}
         except Exception as e:
             logger.error(f"Erreur lors du chargement des données: {str(e)}")
             return {}
 
-    def save_data(self):
-        """Sauvegarde les données dans le fichier JSON"""
-        try:
-            with open(self.filename, 'w') as f:
-                json.dump(self.data, f, indent=4)
-            logger.info("Données sauvegardées avec succès")
-        except Exception as e:
-            logger.error(f"Erreur lors de la sauvegarde des données: {str(e)}")
+    async def save_data_async(self):
+        """Sauvegarde les données sans bloquer la boucle asyncio (écriture disque dans un thread)"""
+        if self._save_lock is None:
+            self._save_lock = asyncio.Lock()
+        # Une seule écriture à la fois : sauvegardes programmées, périodiques et à l'arrêt passent toutes ici
+        async with self._save_lock:
+            # Rien n'a changé depuis la dernière écriture : ni réécriture ni fsync
+            if not self._dirty:
+                return
+            try:
+                # Sérialiser dans la boucle : les commandes peuvent modifier self.data pendant l'écriture
+                content = orjson.dumps(self.data, option=orjson.OPT_INDENT_2)
+                self._dirty = False
+                await asyncio.to_thread(self._write_file, content)
+                logger.info("Données sauvegardées avec succès")
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"Erreur lors de la sauvegarde des données: {str(e)}")
+
+    def schedule_save(self, delay: float = 0.5):
+        """Programme une sauvegarde différée, les modifications rapprochées ne donnant lieu qu'à une écriture"""
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(delay, self._run_scheduled_save)
+
+    def _run_scheduled_save(self):
+        """Exécute la sauvegarde programmée par schedule_save, l'écriture disque se faisant dans un thread"""
+        self._save_handle = None
+        asyncio.create_task(self.save_data_async())
+
+    def _write_file(self, content: bytes):
+        """Écrit le contenu sérialisé dans le fichier de données de manière atomique"""
+        write_file_atomic(self.filename, content)
 
     def add_address(self, address: str, name: str, config: dict):
         """Ajoute une nouvelle adresse avec son nom"""
@@ -60,7 +117,10 @@ class DataManager:
         self.data[address] = config
         self.address_to_name[address] = name
         self.name_to_address[name] = address
-        self.save_data()
+        # Repartir d'une configuration de tracking neuve : canal et filtres suivent la nouvelle config
+        tracking_configs.pop(address, None)
+        self._dirty = True
+        self.schedule_save()
 
     def remove_address(self, identifier: str) -> bool:
         """Supprime une adresse par son nom ou son adresse"""
@@ -82,84 +142,92 @@ class DataManager:
                 if name:
                     del self.name_to_address[name]
                     del self.address_to_name[address]
-                self.save_data()
+                # Les notifications encore en file pour cette config seront ignorées par le worker
+                tracking_configs.pop(address, None)
+                self._dirty = True
+                self.schedule_save()
                 return True
         return False
 
+    def set_last_block(self, address: str, block_number: int):
+        """Enregistre le dernier bloc vérifié d'une adresse (persisté à la prochaine sauvegarde)"""
+        if address in self.data and self.data[address].get('last_block') != block_number:
+            self.data[address]['last_block'] = block_number
+            self._dirty = True
+
     def get_name(self, address: str) -> str:
         """Récupère le nom associé à une adresse"""
         return self.address_to_name.get(address, address[:6] + '...' + address[-4:])
 
-    def is_tx_processed(self, tx_hash: str) -> bool:
-        """Vérifie si une transaction a déjà été traitée"""
-        return tx_hash in self.processed_txs
-
-    def mark_tx_processed(self, tx_hash: str):
-        """Marque une transaction comme traitée"""
-        self.processed_txs.add(tx_hash)
-
-# ABI minimal pour détecter les transferts ERC20
-ERC20_ABI = [
-    {
-        "anonymous": False,
-        "inputs": [
-            {
-                "indexed": True,
-                "name": "from",
-                "type": "address"
-            },
-            {
-                "indexed": True,
-                "name": "to",
-                "type": "address"
-            },
-            {
-                "indexed": False,
-                "name": "value",
-                "type": "uint256"
-            }
-        ],
-        "name": "Transfer",
-        "type": "event"
-    },
-    {
-        "constant": True,
-        "inputs": [],
-        "name": "name",
-        "outputs": [{"name": "", "type": "string"}],
-        "type": "function"
-    },
-    {
-        "constant": True,
-        "inputs": [],
-        "name": "symbol",
-        "outputs": [{"name": "", "type": "string"}],
-        "type": "function"
-    },
-    {
-        "constant": True,
-        "inputs": [],
-        "name": "decimals",
-        "outputs": [{"name": "", "type": "uint8"}],
-        "type": "function"
-    }
-]
+    def is_tx_processed(self, key: str) -> bool:
+        """Vérifie si une transaction a déjà été traitée (clé construite par notification_key)"""
+        return key in self.processed_txs
+
+    def mark_tx_processed(self, key: str):
+        """Marque une transaction comme traitée (clé construite par notification_key)"""
+        if key in self.processed_txs:
+            return
+        # Buffer circulaire : la deque pleine éjecte la clé la plus ancienne, qu'on retire aussi du set
+        if len(self.processed_order) == PROCESSED_TXS_MAX:
+            self.processed_txs.discard(self.processed_order[0])
+        self.processed_order.append(key)
+        self.processed_txs.add(key)
 
-async def get_token_info(token_address: str) -> Dict:
-    """Récupère les informations d'un token ERC20"""
+# Topic de l'event ERC20 Transfer(address,address,uint256)
+TRANSFER_EVENT_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+# Cache des métadonnées de tokens (token_metadata), conservé entre les redémarrages
+TOKEN_CACHE_FILE = 'token_cache.json'
+
+def load_token_cache():
+    """Charge le cache des métadonnées de tokens depuis le disque"""
     try:
-        token_contract = w3.eth.contract(address=token_address, abi=ERC20_ABI)
-        name = await token_contract.functions.name().call()
-        symbol = await token_contract.functions.symbol().call()
-        decimals = await token_contract.functions.decimals().call()
-        return {
-            "name": name,
-            "symbol": symbol,
-            "decimals": decimals
-        }
+        if os.path.exists(TOKEN_CACHE_FILE):
+            with open(TOKEN_CACHE_FILE, 'rb') as f:
+                restore_token_cache(f.read())
     except Exception as e:
-        logger.error(f"Erreur lors de la récupération des infos du token {token_address}: {str(e)}")
-        return None
+        logger.error(f"Erreur lors du chargement du cache des tokens: {str(e)}")
+
+async def save_token_cache_async():
+    """Sauvegarde le cache des tokens s'il a changé, l'écriture disque se faisant dans un thread"""
+    try:
+        # Sérialiser dans la boucle : le cache peut être modifié pendant l'écriture
+        content = snapshot_token_cache()
+        if content is None:
+            return
+        await asyncio.to_thread(write_file_atomic, TOKEN_CACHE_FILE, content)
+    except Exception as e:
+        mark_token_cache_dirty()
+        logger.error(f"Erreur lors de la sauvegarde du cache des tokens: {str(e)}")
+
+load_token_cache()
+
+async def get_token_infos(token_addresses: List[str]) -> Dict[str, Optional[Dict]]:
+    """Récupère les informations de plusieurs tokens ERC20, depuis le cache ou en un seul eth_call Multicall3"""
+    token_infos = {}
+    for token_address in token_addresses:
+        token_info = get_cached_token_info(token_address)
+        if token_info is not None:
+            token_infos[token_address] = token_info
+    token_addresses = [token_address for token_address in token_addresses if token_address not in token_infos]
+    if not token_addresses:
+        return token_infos
+
+    call_data = '0x' + encode_token_info_calls(token_addresses).hex()
+    try:
+        result = (await rpc_batch([('eth_call', [{'to': MULTICALL3_ADDRESS, 'data': call_data}, 'latest'])]))[0]
+        if isinstance(result, Exception):
+            raise result
+        fetched = decode_token_infos(token_addresses, HexBytes(result))
+    except Exception as e:
+        logger.error(f"Erreur lors de l'appel Multicall3 des infos de tokens: {str(e)}")
+        return dict(token_infos, **dict.fromkeys(token_addresses))
+
+    for token_address, token_info in fetched.items():
+        token_infos[token_address] = token_info
+        if token_info is not None:
+            cache_token_info(token_address, token_info)
+    return token_infos
 
 # Initialisation du gestionnaire de données
 data_manager = DataManager()
@@ -167,42 +235,89 @@ data_manager = DataManager()
 # Chargement des variables d'environnement
 load_dotenv()
 
+# URLs Alchemy calculées une fois au chargement (None sans clé configurée)
+ALCHEMY_API_KEY = os.getenv('ALCHEMY_API_KEY')
+ALCHEMY_URL = f"https://base-mainnet.g.alchemy.com/v2/{ALCHEMY_API_KEY}" if ALCHEMY_API_KEY else None
+ALCHEMY_WS_URL = f"wss://base-mainnet.g.alchemy.com/v2/{ALCHEMY_API_KEY}" if ALCHEMY_API_KEY else None
+
 # Configuration du bot
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
 
-def setup_web3_connection(max_retries=3, retry_delay=5):
+class TrackingBot(commands.Bot):
+    async def setup_hook(self):
+        """Établit la connexion Web3 avant la connexion à Discord"""
+        global w3, new_head_event, notification_queue, rpc_semaphore
+        w3 = await setup_web3_connection()
+
+        # Vérification finale de la connexion
+        if not await w3.is_connected():
+            raise Exception("Impossible de se connecter à un nœud Base")
+
+        # Les souscriptions WebSocket ne sont disponibles que via Alchemy
+        new_head_event = asyncio.Event()
+        notification_queue = asyncio.Queue()
+        rpc_semaphore = asyncio.Semaphore(RPC_MAX_CONCURRENCY)
+        if ALCHEMY_WS_URL:
+            asyncio.create_task(watch_new_heads())
+        # Démarrées une seule fois ici : on_ready est rappelé à chaque reconnexion à la gateway
+        asyncio.create_task(monitor_addresses())
+        asyncio.create_task(notification_worker())
+
+    async def close(self):
+        """Ferme la connexion Discord, sauvegarde les curseurs de blocs et le cache des tokens puis ferme la session HTTP partagée"""
+        await super().close()
+        # Passe par le verrou de sauvegarde : attend une éventuelle écriture en cours au lieu de la chevaucher
+        await data_manager.save_data_async()
+        await save_token_cache_async()
+        if http_session is not None and not http_session.closed:
+            await http_session.close()
+
+bot = TrackingBot(command_prefix='!', intents=intents)
+
+# Session HTTP partagée par les providers pour réutiliser les connexions (keep-alive)
+http_session: aiohttp.ClientSession = None
+HTTP_POOL_SIZE = 64  # connexions simultanées (boucle de monitoring + commandes)
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Retourne la session aiohttp partagée, créée au premier appel"""
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE, limit_per_host=HTTP_POOL_SIZE, keepalive_timeout=75, ttl_dns_cache=300
+            )
+        )
+    return http_session
+
+async def create_web3(url: str, headers: Dict = None) -> AsyncWeb3:
+    """Crée une instance AsyncWeb3 branchée sur la session HTTP partagée"""
+    request_kwargs = {'timeout': aiohttp.ClientTimeout(total=30)}
+    if headers:
+        request_kwargs['headers'] = headers
+    provider = AsyncHTTPProvider(url, request_kwargs=request_kwargs)
+    await provider.cache_async_session(get_http_session())
+    # Base (OP Stack) n'a pas besoin du middleware PoA : extraData reste sous 32 octets
+    return AsyncWeb3(provider)
+
+async def setup_web3_connection(max_retries=3, retry_delay=5) -> AsyncWeb3:
     """Configure la connexion Web3 avec retry pour Alchemy"""
-    ALCHEMY_API_KEY = os.getenv('ALCHEMY_API_KEY')
-    
-    if not ALCHEMY_API_KEY:
+    if not ALCHEMY_URL:
         logger.warning("Pas de clé Alchemy configurée, utilisation du RPC public...")
-        return Web3(Web3.HTTPProvider('https://mainnet.base.org'))
+        return await create_web3('https://mainnet.base.org')
 
     for attempt in range(max_retries):
         try:
             logger.info(f"Tentative de connexion à Alchemy (essai {attempt + 1}/{max_retries})...")
             
-            ALCHEMY_URL = f"https://base-mainnet.g.alchemy.com/v2/{ALCHEMY_API_KEY}"
             headers = {
                 "Accept": "application/json",
                 "Content-Type": "application/json"
             }
-            provider = Web3.HTTPProvider(
-                ALCHEMY_URL,
-                request_kwargs={
-                    'headers': headers,
-                    'timeout': 30
-                }
-            )
-            w3 = Web3(provider)
+            w3 = await create_web3(ALCHEMY_URL, headers)
             
-            if w3.is_connected():
-                # Test supplémentaire pour vérifier la connexion
-                block = w3.eth.block_number
+            if await w3.is_connected():
                 logger.info(f"Connecté à Alchemy avec succès! Version de l'API: {w3.api}")
-                logger.info(f"Dernier bloc: {block}")
                 return w3
             
             logger.warning(f"Échec de la connexion à Alchemy (tentative {attempt + 1})")
@@ -211,125 +326,667 @@ def setup_web3_connection(max_retries=3, retry_delay=5):
             logger.error(f"Erreur lors de la connexion à Alchemy: {str(e)}")
         
         if attempt < max_retries - 1:
-            logger.info(f"Nouvelle tentative dans {retry_delay} secondes...")
-            time.sleep(retry_delay)
+            # Backoff exponentiel avec jitter, plafonné à 30 secondes
+            delay = min(retry_delay * 2 ** attempt + random.random(), 30)
+            logger.info(f"Nouvelle tentative dans {delay:.1f} secondes...")
+            await asyncio.sleep(delay)
     
     logger.warning("Impossible de se connecter à Alchemy après plusieurs tentatives, utilisation du RPC public...")
-    return Web3(Web3.HTTPProvider('https://mainnet.base.org'))
+    return await create_web3('https://mainnet.base.org')
+
+# Configuration Web3 (initialisée dans setup_hook, avant la connexion à Discord)
+w3: AsyncWeb3 = None
+
+# Dernier bloc annoncé par la souscription newHeads (None si la souscription est inactive)
+latest_head: int = None
+new_head_event: asyncio.Event = None
+# Délai sans nouveau bloc au-delà duquel la souscription est considérée comme morte (~15 blocs Base)
+NEW_HEAD_TIMEOUT = 30
 
-# Configuration Web3
-w3 = setup_web3_connection()
+async def watch_new_heads():
+    """Suit les nouveaux blocs via une souscription WebSocket newHeads et réveille la boucle de monitoring"""
+    global latest_head
+    while True:
+        try:
+            # Souscription JSON-RPC écrite à la main sur la session partagée, comme post_rpc : receive() attend
+            # réellement le prochain message (process_subscriptions de web3 6 scrute sa file en boucle active)
+            async with get_http_session().ws_connect(ALCHEMY_WS_URL) as ws:
+                await ws.send_str(orjson.dumps(
+                    {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['newHeads']}
+                ).decode())
+                while True:
+                    # Socket ouvert mais muet : ne pas rester bloqué sur un bloc figé, forcer une resouscription
+                    message = await ws.receive(timeout=NEW_HEAD_TIMEOUT)
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        raise ConnectionError(f"WebSocket fermé ({message.type.name})")
+                    response = orjson.loads(message.data)
+                    if response.get('id') == 1:
+                        # Réponse à eth_subscribe : identifiant de souscription ou erreur
+                        if response.get('error'):
+                            raise ValueError(f"eth_subscribe: {response['error']}")
+                        logger.info("Souscription newHeads active")
+                    elif response.get('method') == 'eth_subscription':
+                        latest_head = int(response['params']['result']['number'], 16)
+                        new_head_event.set()
+        except asyncio.TimeoutError:
+            logger.warning(f"Aucun bloc reçu via newHeads depuis {NEW_HEAD_TIMEOUT}s, resouscription")
+        except Exception as e:
+            logger.error(f"Erreur de la souscription newHeads: {str(e)}")
 
-# Vérification finale de la connexion
-if not w3.is_connected():
-    raise Exception("Impossible de se connecter à un nœud Base")
+        # Revenir au polling le temps de rétablir la souscription
+        latest_head = None
+        await asyncio.sleep(30)
 
-# Activer le middleware pour gérer les requêtes asynchrones
-from web3.middleware import geth_poa_middleware
-w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+async def wait_for_next_block(timeout: float):
+    """Attend le prochain bloc annoncé par newHeads, ou le délai de polling si la souscription est inactive"""
+    if latest_head is None:
+        await asyncio.sleep(timeout)
+        return
+
+    try:
+        await asyncio.wait_for(new_head_event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    new_head_event.clear()
 
 # Structure de données pour stocker les configurations de tracking
-tracking_configs: Dict[str, Dict] = {}
+tracking_configs: Dict[str, 'TrackingConfig'] = {}
+
+# Bornes de la taille des plages de blocs interrogées en une fois
+INITIAL_BLOCK_RANGE = 500
+MIN_BLOCK_RANGE = 50
+MAX_BLOCK_RANGE = 10_000
+# Sans Alchemy, chaque bloc est téléchargé complet (toutes ses transactions) : plages bien plus courtes
+FALLBACK_MAX_BLOCK_RANGE = 200
+# Nombre maximum de blocs rattrapés au démarrage (~1 jour sur Base, 1 bloc toutes les 2s)
+MAX_CATCHUP_BLOCKS = 43_200
 
 class TrackingConfig:
-    def __init__(self, address: str, channel_id: int, filters: Dict = None):
+    __slots__ = (
+        'address', 'address_topic', 'filters', 'last_block', 'notified_block', 'block_range',
+        'send_failures', 'retry_at'
+    )
+
+    def __init__(self, address: str, last_block: int, filters: Dict = None):
         self.address = address.lower()
-        self.channel_id = channel_id
+        # Topic de log de l'adresse, calculé une fois pour les filtres eth_getLogs
+        self.address_topic = address_to_topic(self.address)
         self.filters = filters or {}
-        self.last_block = w3.eth.block_number
+        # last_block : dernier bloc scanné ; notified_block : dernier bloc dont les notifications sont parties (persisté)
+        self.last_block = last_block
+        self.notified_block = last_block
+        self.block_range = INITIAL_BLOCK_RANGE
+        # Envois en échec consécutifs et instant (horloge de la boucle) avant lequel l'adresse n'est pas rescannée
+        self.send_failures = 0
+        self.retry_at = 0.0
 
 @bot.event
 async def on_ready():
     print(f'{bot.user} est connecté et prêt!')
     # Charger les configurations sauvegardées
     logger.info(f"Configurations chargées: {len(data_manager.data)} adresses")
-    # Démarrer la tâche de monitoring
-    bot.loop.create_task(monitor_addresses())
+
+def address_to_topic(address: str) -> str:
+    """Convertit une adresse en topic de log (32 octets, complété à gauche)"""
+    return '0x' + address[2:].lower().rjust(64, '0')
+
+def is_alchemy_provider() -> bool:
+    """Indique si le provider courant expose l'API enrichie d'Alchemy"""
+    return 'alchemy.com' in str(getattr(w3.provider, 'endpoint_uri', ''))
+
+# Limite de requêtes HTTP simultanées vers le provider, et relances sur HTTP 429 (rate limit)
+RPC_MAX_CONCURRENCY = 16
+RPC_MAX_RETRIES = 4
+RPC_MAX_BACKOFF = 30
+RPC_MAX_REQUESTS_PER_SECOND = int(os.getenv('RPC_MAX_REQUESTS_PER_SECOND', '25'))
+rpc_semaphore: asyncio.Semaphore = None
+rpc_next_slot = 0.0
+
+async def throttle_rpc():
+    """Espace les requêtes pour rester sous le débit autorisé du provider plutôt que de subir des 429"""
+    global rpc_next_slot
+    now = asyncio.get_running_loop().time()
+    # Réservation du créneau sans await intermédiaire : pas de verrou nécessaire sur une seule boucle
+    slot = max(now, rpc_next_slot)
+    rpc_next_slot = slot + 1 / RPC_MAX_REQUESTS_PER_SECOND
+    if slot > now:
+        await asyncio.sleep(slot - now)
+
+async def post_rpc(payload) -> object:
+    """Envoie une requête JSON-RPC au provider en respectant la limite de concurrence, avec backoff exponentiel sur 429"""
+    for attempt in range(RPC_MAX_RETRIES + 1):
+        await throttle_rpc()
+        async with rpc_semaphore:
+            # orjson pour (dé)sérialiser les réponses volumineuses (blocs complets, logs) plus vite que json
+            async with get_http_session().post(
+                w3.provider.endpoint_uri, data=orjson.dumps(payload),
+                headers={'Content-Type': 'application/json'}, timeout=aiohttp.ClientTimeout(total=30)
+            ) as response:
+                if response.status != 429 or attempt == RPC_MAX_RETRIES:
+                    response.raise_for_status()
+                    return orjson.loads(await response.read())
+                retry_after = response.headers.get('Retry-After', '')
+        # Retry-After du provider s'il est fourni, sinon backoff exponentiel avec jitter pour désynchroniser les reprises
+        if retry_after.isdigit():
+            delay = min(int(retry_after), RPC_MAX_BACKOFF)
+        else:
+            delay = min(2 ** attempt + random.random(), RPC_MAX_BACKOFF)
+        logger.warning(f"Limite de requêtes du provider atteinte, nouvelle tentative dans {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+async def rpc_batch(calls: List[Tuple[str, List]]) -> List:
+    """Envoie plusieurs appels JSON-RPC en une seule requête HTTP et retourne leurs résultats dans l'ordre
+
+    Un appel en erreur est représenté par une ValueError à sa position dans la liste.
+    """
+    payload = [
+        {'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params}
+        for request_id, (method, params) in enumerate(calls)
+    ]
+    responses = await post_rpc(payload)
+
+    if not isinstance(responses, list):
+        # Certains nœuds répondent par une erreur unique lorsqu'ils refusent les batchs
+        raise ValueError(f"Requête batch refusée: {responses.get('error', responses)}")
+
+    # L'ordre des réponses d'un batch n'est pas garanti : démultiplexer par id
+    responses_by_id = {response.get('id'): response for response in responses}
+    results = []
+    for request_id, (method, _) in enumerate(calls):
+        response = responses_by_id.get(request_id)
+        if response is None or response.get('error'):
+            error = response.get('error') if response else "réponse manquante"
+            results.append(ValueError(f"{method}: {error}"))
+        else:
+            results.append(response['result'])
+    return results
+
+def asset_transfers_params(address: str, from_block: int, to_block: int, direction: str) -> Dict:
+    """Construit les paramètres alchemy_getAssetTransfers des transferts ETH envoyés ('from') ou reçus ('to')"""
+    params = {
+        'fromBlock': hex(from_block),
+        'toBlock': hex(to_block),
+        'category': ['external'],
+        'excludeZeroValue': False
+    }
+    params['fromAddress' if direction == 'from' else 'toAddress'] = address
+    return params
+
+def get_address_topic(address: str) -> str:
+    """Retourne le topic de log d'une adresse, précalculé pour les adresses trackées"""
+    tracking_config = tracking_configs.get(address)
+    return tracking_config.address_topic if tracking_config else address_to_topic(address)
+
+def transfer_logs_filter(address_topics: List[str], from_block: int, to_block: int, direction: str, token_address: str = None) -> Dict:
+    """Construit le filtre eth_getLogs des transferts ERC20 envoyés ('from') ou reçus ('to') par un ensemble d'adresses"""
+    if direction == 'from':
+        topics = [TRANSFER_EVENT_TOPIC, address_topics]
+    else:
+        topics = [TRANSFER_EVENT_TOPIC, None, address_topics]
+    log_filter = {
+        'fromBlock': hex(from_block),
+        'toBlock': hex(to_block),
+        'topics': topics
+    }
+    # Restreindre aux transferts d'un seul token lorsque l'adresse est trackée avec token=
+    if token_address:
+        log_filter['address'] = token_address
+    return log_filter
+
+def format_asset_transfer(transfer: Dict) -> Dict:
+    """Convertit un transfert ETH d'Alchemy au format des transactions (hash, from, to, value en wei)"""
+    raw_value = transfer['rawContract'].get('value')
+    return {
+        'hash': transfer['hash'],
+        'from': to_checksum(transfer['from']),
+        'to': to_checksum(transfer['to']) if transfer.get('to') else None,
+        'value': int(raw_value, 16) if raw_value else 0
+    }
+
+async def get_asset_transfers(params: Dict, result: Dict) -> List[Dict]:
+    """Extrait les transactions d'une réponse alchemy_getAssetTransfers en récupérant les pages suivantes"""
+    transactions = [format_asset_transfer(transfer) for transfer in result['transfers']]
+    # Les résultats sont paginés par Alchemy
+    while result.get('pageKey'):
+        result = (await rpc_batch([('alchemy_getAssetTransfers', [dict(params, pageKey=result['pageKey'])])]))[0]
+        if isinstance(result, Exception):
+            raise result
+        transactions.extend(format_asset_transfer(transfer) for transfer in result['transfers'])
+    return transactions
+
+# Nombre de blocs demandés par requête batch eth_getBlockByNumber
+BLOCK_BATCH_SIZE = 50
+# Nombre maximal de blocs complets gardés en mémoire à la fois pendant un scan
+SCAN_WINDOW_BLOCKS = 100
+
+async def get_full_blocks(from_block: int, to_block: int) -> List[Dict]:
+    """Récupère les blocs d'une plage avec leurs transactions, demandés par batch"""
+    # Pas de cache : chaque bloc n'est téléchargé qu'une fois par passe, pour toutes les adresses à la fois
+    block_nums = list(range(from_block, to_block + 1))
+    # Les batchs partent en parallèle, la concurrence étant bornée par rpc_semaphore
+    chunks = [block_nums[start:start + BLOCK_BATCH_SIZE] for start in range(0, len(block_nums), BLOCK_BATCH_SIZE)]
+    chunk_results = await asyncio.gather(*(
+        rpc_batch([('eth_getBlockByNumber', [hex(block_num), True]) for block_num in chunk]) for chunk in chunks
+    ))
+    blocks = []
+    for chunk, results in zip(chunks, chunk_results):
+        for block_num, block in zip(chunk, results):
+            if isinstance(block, Exception):
+                raise block
+            if block is None:
+                raise ValueError(f"Bloc {block_num} introuvable")
+            blocks.append(block)
+    return blocks
+
+async def scan_blocks_for_transfers(scans: List[Tuple[str, int, int]]) -> Dict[str, Tuple[List[Dict], List[Dict]]]:
+    """Parcourt une seule fois les blocs de toutes les plages pour trouver les transactions envoyées et reçues (RPC sans API Alchemy)"""
+    # Les blocs bruts contiennent des adresses en minuscules : on indexe les plages par adresse minuscule
+    ranges = {address.lower(): (from_block, to_block) for address, from_block, to_block in scans}
+    matches = {address.lower(): ([], []) for address, _, _ in scans}
+    # Fusionner les plages qui se chevauchent : les blocs entre deux plages disjointes ne sont pas téléchargés
+    intervals = []
+    for from_block, to_block in sorted((from_block, to_block) for _, from_block, to_block in scans):
+        if intervals and from_block <= intervals[-1][1] + 1:
+            intervals[-1][1] = max(intervals[-1][1], to_block)
+        else:
+            intervals.append([from_block, to_block])
+
+    # Fenêtres bornées : chaque lot de blocs est analysé puis libéré avant le suivant
+    for first_block, last_block in intervals:
+        for window_start in range(first_block, last_block + 1, SCAN_WINDOW_BLOCKS):
+            window_end = min(window_start + SCAN_WINDOW_BLOCKS - 1, last_block)
+            for block in await get_full_blocks(window_start, window_end):
+                block_num = int(block['number'], 16)
+                for tx in block['transactions']:
+                    for index, field in enumerate(('from', 'to')):
+                        block_range = ranges.get(tx[field])
+                        if block_range and block_range[0] <= block_num <= block_range[1]:
+                            matches[tx[field]][index].append(format_transaction(tx))
+    return {address: matches[address.lower()] for address, _, _ in scans}
+
+def format_log(raw_log: Dict) -> Dict:
+    """Convertit un log JSON-RPC brut au format retourné par web3"""
+    return {
+        'address': to_checksum(raw_log['address']),
+        'topics': [HexBytes(topic) for topic in raw_log['topics']],
+        'data': HexBytes(raw_log['data']),
+        'blockNumber': int(raw_log['blockNumber'], 16),
+        'logIndex': int(raw_log['logIndex'], 16),
+        # Le hash reste en hexadécimal : il ne sert qu'au lien explorer et au dédoublonnage
+        'transactionHash': raw_log['transactionHash']
+    }
+
+async def fetch_address_activity(scans: List[Tuple[str, int, int]]) -> List:
+    """Récupère en une seule requête HTTP l'activité de plusieurs adresses, chacune sur sa plage de blocs
+
+    Retourne pour chaque plage un dict des transactions et logs envoyés/reçus, ou l'exception rencontrée.
+    """
+    use_alchemy = is_alchemy_provider()
+
+    # Les adresses partageant la même plage de blocs et le même filtre de token sont interrogées ensemble :
+    # un seul eth_getLogs par direction avec la liste de leurs topics (OR), le token étant filtré par le nœud
+    ranges: Dict[Tuple[int, int, Optional[str]], List[str]] = {}
+    for address, from_block, to_block in scans:
+        tracking_config = tracking_configs.get(address)
+        token_address = tracking_config.filters.get('token_address') if tracking_config else None
+        ranges.setdefault((from_block, to_block, token_address), []).append(address)
+
+    calls = []
+    for (from_block, to_block, token_address), addresses in ranges.items():
+        address_topics = [get_address_topic(address) for address in addresses]
+        calls.append(('eth_getLogs', [transfer_logs_filter(address_topics, from_block, to_block, 'from', token_address)]))
+        calls.append(('eth_getLogs', [transfer_logs_filter(address_topics, from_block, to_block, 'to', token_address)]))
+    # alchemy_getAssetTransfers n'accepte qu'une adresse par direction
+    transfer_calls_start = len(calls)
+    if use_alchemy:
+        for address, from_block, to_block in scans:
+            calls.append(('alchemy_getAssetTransfers', [asset_transfers_params(address, from_block, to_block, 'from')]))
+            calls.append(('alchemy_getAssetTransfers', [asset_transfers_params(address, from_block, to_block, 'to')]))
+
+    results = await rpc_batch(calls)
+
+    # Répartir les logs de chaque plage entre ses adresses selon le topic from (1) ou to (2)
+    logs: Dict[str, object] = {}
+    for index, addresses in enumerate(ranges.values()):
+        sent_result, received_result = results[2 * index], results[2 * index + 1]
+        error = next((result for result in (sent_result, received_result) if isinstance(result, Exception)), None)
+        if error:
+            for address in addresses:
+                logs[address] = error
+            continue
+
+        topic_to_address = {get_address_topic(address): address for address in addresses}
+        for address in addresses:
+            logs[address] = ([], [])
+        # Dispatch sur les topics bruts (hexadécimal minuscule) avant toute conversion ;
+        # seuls les logs retenus sont formatés. Les transferts ERC721 (4 topics) sont écartés.
+        for position, raw_logs in ((1, sent_result), (2, received_result)):
+            for raw_log in raw_logs:
+                if len(raw_log['topics']) != 3:
+                    continue
+                address = topic_to_address.get(raw_log['topics'][position])
+                if address:
+                    logs[address][position - 1].append(format_log(raw_log))
+
+    if not use_alchemy:
+        try:
+            native_txs = await scan_blocks_for_transfers(scans)
+        except Exception as e:
+            return [e] * len(scans)
+
+    async def build_activity(index: int) -> Dict:
+        address, from_block, to_block = scans[index]
+        if isinstance(logs[address], Exception):
+            raise logs[address]
+        sent_logs, received_logs = logs[address]
+
+        if use_alchemy:
+            first = transfer_calls_start + 2 * index
+            for result in results[first:first + 2]:
+                if isinstance(result, Exception):
+                    raise result
+            sent_txs = await get_asset_transfers(calls[first][1][0], results[first])
+            received_txs = await get_asset_transfers(calls[first + 1][1][0], results[first + 1])
+        else:
+            sent_txs, received_txs = native_txs[address]
+
+        return {
+            'sent_txs': sent_txs,
+            'received_txs': received_txs,
+            'sent_logs': sent_logs,
+            'received_logs': received_logs
+        }
+
+    # Les pages Alchemy supplémentaires des différentes adresses sont récupérées en parallèle
+    return list(await asyncio.gather(
+        *(build_activity(index) for index in range(len(scans))), return_exceptions=True
+    ))
+
+WEI_PER_ETH = 10 ** 18
+
+# Fragments constants des embeds de notification
+TX_TYPE_LABELS = {True: "Transaction envoyée ➡️", False: "Transaction reçue ⬅️"}
+EXPLORER_LINK_TEMPLATE = "[Voir la transaction sur Basescan](https://basescan.org/tx/{})"
+
+# Nombre maximum d'embeds par message Discord
+DISCORD_MAX_EMBEDS = 10
+
+class ChannelUnavailableError(Exception):
+    """Canal de notification durablement inutilisable (absent, supprimé ou sans permission d'envoi)"""
+
+async def send_embeds(address: str, embeds: List[discord.Embed]) -> int:
+    """Envoie les embeds dans le canal de l'adresse, regroupés en un minimum de messages, et retourne le nombre envoyé
+
+    Lève ChannelUnavailableError lorsqu'un nouvel essai ne pourrait pas réussir.
+    """
+    # Le canal est relu dans la configuration courante de l'adresse
+    config = data_manager.data.get(address)
+    if not config or config.get('channel_id') is None:
+        raise ChannelUnavailableError(f"configuration de canal manquante pour l'adresse {address}")
+
+    channel_id = config['channel_id']
+    channel = bot.get_channel(channel_id)
+    if not channel:
+        # Canal absent du cache local (pas encore reçu de la gateway) : le demander à l'API
+        try:
+            channel = await bot.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden) as e:
+            raise ChannelUnavailableError(f"canal Discord {channel_id} inaccessible: {str(e)}")
+        except discord.HTTPException as e:
+            logger.error(f"Canal Discord {channel_id} indisponible pour l'adresse {address}: {str(e)}")
+            return 0
+
+    # Arrêt au premier message en échec : l'appelant sait quels embeds sont effectivement partis
+    for start in range(0, len(embeds), DISCORD_MAX_EMBEDS):
+        try:
+            await channel.send(embeds=embeds[start:start + DISCORD_MAX_EMBEDS])
+        except (discord.NotFound, discord.Forbidden) as e:
+            raise ChannelUnavailableError(f"envoi impossible dans le canal {channel_id}: {str(e)}")
+        except discord.HTTPException as e:
+            logger.error(f"Erreur lors de l'envoi des notifications pour {address}: {str(e)}")
+            return start
+    return len(embeds)
+
+# Nombre de reçus de transactions demandés par requête batch
+RECEIPT_BATCH_SIZE = 40
+
+def format_transaction(raw_tx: Dict) -> Dict:
+    """Convertit les champs utilisés d'une transaction JSON-RPC brute au format retourné par web3"""
+    return {
+        'hash': raw_tx['hash'],
+        'from': to_checksum(raw_tx['from']),
+        'to': to_checksum(raw_tx['to']) if raw_tx.get('to') else None,
+        'value': int(raw_tx['value'], 16)
+    }
+
+async def fetch_receipts(tx_hashes: List[str]) -> Dict[str, Dict]:
+    """Récupère par batch le reçu de chaque transaction, en ignorant celles introuvables"""
+    receipts = {}
+    for start in range(0, len(tx_hashes), RECEIPT_BATCH_SIZE):
+        chunk = tx_hashes[start:start + RECEIPT_BATCH_SIZE]
+        results = await rpc_batch([('eth_getTransactionReceipt', [tx_hash]) for tx_hash in chunk])
+        for tx_hash, raw_receipt in zip(chunk, results):
+            if isinstance(raw_receipt, Exception) or not raw_receipt:
+                logger.warning(f"Transaction {tx_hash} introuvable")
+                continue
+            receipts[tx_hash] = {'status': int(raw_receipt['status'], 16)}
+    return receipts
+
+def notification_key(address: str, tx_hash: str, log_index: int = None) -> str:
+    """Clé de dédoublonnage d'une notification, propre à l'adresse trackée qu'elle concerne"""
+    # Une même transaction peut concerner deux adresses trackées (envoi de A vers B) : chacune est notifiée
+    if log_index is None:
+        return f"{address}:{tx_hash}"
+    return f"{address}:{tx_hash}:{log_index}"
+
+async def notify_address_activity(address: str, activity: Dict) -> bool:
+    """Notifie les transactions et transferts ERC20 trouvés pour une adresse, retourne False si l'envoi est à réessayer"""
+    # Les transactions arrivent avec from/to/value (transferts Alchemy ou blocs) : seul le reçu reste à récupérer
+    sent_txs = {tx['hash']: tx for tx in activity['sent_txs']}
+    # Une transaction vers soi-même n'est notifiée qu'une fois, comme envoi
+    received_txs = {tx['hash']: tx for tx in activity['received_txs'] if tx['hash'] not in sent_txs}
+    # Filtre min= appliqué avant toute requête : les transactions ETH trop petites ne coûtent pas de reçu.
+    # Avec un filtre token=, le minimum s'exprime dans l'unité de ce token et ne s'applique pas à l'ETH
+    tracking_config = tracking_configs.get(address)
+    filters = tracking_config.filters if tracking_config else {}
+    min_amount = filters.get('min_amount')
+    min_value = min_amount * WEI_PER_ETH if min_amount and not filters.get('token_address') else 0
+    new_txs = {
+        tx_hash: tx for tx_hash, tx in {**received_txs, **sent_txs}.items()
+        if tx['value'] >= min_value and not data_manager.is_tx_processed(notification_key(address, tx_hash))
+    }
+    receipts = await fetch_receipts(list(new_txs)) if new_txs else {}
+
+    # Chaque embed est associé à sa clé de dédoublonnage (adresse et hash, plus logIndex pour un transfert de token)
+    embeds = []
+    notified_keys = []
+    for tx_hash, receipt in receipts.items():
+        embed = await process_transaction(
+            tx_hash, address, new_txs[tx_hash], receipt, is_outgoing=tx_hash in sent_txs
+        )
+        if embed:
+            embeds.append(embed)
+            notified_keys.append(notification_key(address, tx_hash))
+
+    # Métadonnées de tous les tokens concernés en une seule requête batch
+    token_addresses = list({log['address'] for log in activity['sent_logs'] + activity['received_logs']})
+    token_infos = await get_token_infos(token_addresses) if token_addresses else {}
+
+    token_min_amount = min_amount if filters.get('token_address') else None
+    for logs, is_outgoing in ((activity['sent_logs'], True), (activity['received_logs'], False)):
+        for log in logs:
+            log_key = notification_key(address, log['transactionHash'], log['logIndex'])
+            # Déjà envoyé lors d'une tentative précédente de la même plage
+            if data_manager.is_tx_processed(log_key):
+                continue
+            embed = await process_token_transfer(
+                log['transactionHash'], address, log, token_infos.get(log['address']) or {},
+                is_outgoing=is_outgoing, min_amount=token_min_amount
+            )
+            if embed:
+                embeds.append(embed)
+                notified_keys.append(log_key)
+
+    if not embeds:
+        return True
+    try:
+        sent = await send_embeds(address, embeds)
+    except ChannelUnavailableError as e:
+        # Réessayer ne changerait rien : les notifications de la plage sont abandonnées et le curseur avance
+        logger.error(f"Notifications abandonnées pour l'adresse {address}: {str(e)}")
+        return True
+    # Marquer comme traité ce qui est effectivement parti : un nouvel essai de la plage ne renverra que le reste
+    for key in notified_keys[:sent]:
+        data_manager.mark_tx_processed(key)
+    if sent:
+        logger.info(f"{sent} notification(s) envoyée(s) pour l'adresse {address}")
+    return sent == len(embeds)
+
+# File d'attente entre le scan des blocs et l'envoi des notifications Discord
+notification_queue: asyncio.Queue = None
+# Envois en échec passager : nouvel essai avec backoff exponentiel, plage abandonnée après N tentatives
+NOTIFY_MAX_ATTEMPTS = 5
+NOTIFY_RETRY_DELAY = 30
+NOTIFY_MAX_RETRY_DELAY = 600
+
+async def notification_worker():
+    """Envoie les notifications mises en file par la boucle de monitoring puis valide le curseur de blocs"""
+    while True:
+        address, tracking_config, start_block, end_block, activity = await notification_queue.get()
+        try:
+            # Adresse retirée ou re-trackée depuis le scan : la plage ne la concerne plus
+            if tracking_configs.get(address) is not tracking_config:
+                continue
+            # Une plage précédente a échoué : celle-ci sera rescannée depuis le curseur validé
+            if start_block != tracking_config.notified_block + 1:
+                continue
+
+            try:
+                success = await notify_address_activity(address, activity)
+            except Exception as e:
+                logger.error(f"Erreur lors de la notification pour {address}: {str(e)}")
+                success = False
+
+            if not success:
+                tracking_config.send_failures += 1
+                if tracking_config.send_failures < NOTIFY_MAX_ATTEMPTS:
+                    delay = min(NOTIFY_RETRY_DELAY * 2 ** (tracking_config.send_failures - 1), NOTIFY_MAX_RETRY_DELAY)
+                    logger.warning(f"Notifications non envoyées pour {address} (blocs {start_block} à {end_block}), nouvelle tentative dans {delay}s")
+                    # Reculer le curseur de scan : la plage sera rescannée une fois le délai écoulé
+                    tracking_config.last_block = tracking_config.notified_block
+                    tracking_config.retry_at = asyncio.get_running_loop().time() + delay
+                    continue
+                logger.error(f"Notifications abandonnées pour {address} (blocs {start_block} à {end_block}) après {NOTIFY_MAX_ATTEMPTS} tentatives")
+
+            # Le curseur persisté n'avance qu'une fois les notifications de la plage envoyées (ou abandonnées)
+            tracking_config.send_failures = 0
+            tracking_config.notified_block = end_block
+            data_manager.set_last_block(address, end_block)
+        finally:
+            notification_queue.task_done()
 
 async def monitor_addresses():
     """Surveille les transactions pour les adresses trackées"""
     global w3
-    last_checked_block = {}
     consecutive_errors = 0
     max_consecutive_errors = 5
     base_sleep_time = 12
+    # Sauvegarder les curseurs de blocs tous les N cycles plutôt qu'à chaque avancée
+    cursor_save_interval = 10
+    cycles_since_save = 0
+    # Dernier bloc de tête traité, pour ne pas refaire un cycle sans nouveau bloc
+    last_head = None
+    # Les canaux Discord ne sont connus qu'une fois le bot prêt
+    await bot.wait_until_ready()
     
     while True:
         try:
             # Vérifier la connexion Web3
-            if not w3.is_connected():
+            if not await w3.is_connected():
                 logger.error("Connexion Web3 perdue, tentative de reconnexion...")
-                w3 = setup_web3_connection()
-                if not w3.is_connected():
+                w3 = await setup_web3_connection()
+                if not await w3.is_connected():
                     await asyncio.sleep(30)
                     continue
 
-            current_block = w3.eth.block_number
-            logger.info(f"\n{'='*50}\nVérification du bloc {current_block}")
+            current_block = latest_head if latest_head is not None else await w3.eth.block_number
+            if current_block == last_head:
+                await wait_for_next_block(base_sleep_time)
+                continue
+            last_head = current_block
+            # Logs de la boucle chaude en debug, formatés paresseusement (rien n'est construit au niveau INFO)
+            logger.debug("Vérification du bloc %s", current_block)
             
-            for address in data_manager.data.keys():
+            # Oublier les adresses qui ne sont plus trackées
+            for address in list(tracking_configs):
+                if address not in data_manager.data:
+                    del tracking_configs[address]
+
+            for address, config in data_manager.data.items():
+                if address not in tracking_configs:
+                    filters = {key: config[key] for key in ('token_address', 'min_amount') if key in config}
+                    # Reprendre au dernier bloc sauvegardé pour ne rien manquer après un redémarrage
+                    # en bornant le rattrapage après un long arrêt
+                    last_block = max(config.get('last_block', current_block - 1), current_block - MAX_CATCHUP_BLOCKS)
+                    tracking_configs[address] = TrackingConfig(address, last_block, filters)
+
+            # Avancer par plages adaptatives, toutes les adresses étant interrogées dans un même batch
+            max_block_range = MAX_BLOCK_RANGE if is_alchemy_provider() else FALLBACK_MAX_BLOCK_RANGE
+            # Les adresses dont l'envoi a échoué attendent la fin de leur backoff
+            now = asyncio.get_running_loop().time()
+            pending = [
+                address for address, config in tracking_configs.items()
+                if config.last_block < current_block and config.retry_at <= now
+            ]
+            while pending:
+                scans = []
+                for address in pending:
+                    tracking_config = tracking_configs[address]
+                    start_block = tracking_config.last_block + 1
+                    end_block = min(start_block + min(tracking_config.block_range, max_block_range) - 1, current_block)
+                    logger.debug("Vérification de l'adresse %s (blocs %s à %s)", address, start_block, end_block)
+                    scans.append((address, tracking_config, start_block, end_block))
+
                 try:
-                    # Conversion en checksum address
-                    checksum_address = Web3.to_checksum_address(address)
-                    
-                    if address not in last_checked_block:
-                        last_checked_block[address] = current_block - 1
-                    
-                    last_block = last_checked_block[address]
-                    logger.info(f"\nVérification de l'adresse: {checksum_address}")
-                    logger.info(f"Dernier bloc vérifié: {last_block}")
-                    
-                    # Limiter le nombre de blocs à vérifier pour éviter les timeouts
-                    max_blocks_to_check = 10
-                    start_block = max(last_block + 1, current_block - max_blocks_to_check)
-                    
-                    # Vérification des transactions
-                    for block_num in range(start_block, current_block + 1):
-                        try:
-                            block = w3.eth.get_block(block_num, True)
-                            if block and 'transactions' in block:
-                                for tx in block['transactions']:
-                                    tx_hash = tx['hash'].hex()
-                                    
-                                    # Vérifier les transactions ETH
-                                    if tx['from'].lower() == address.lower():
-                                        await process_transaction(tx_hash, address, is_outgoing=True)
-                                    elif tx['to'] and tx['to'].lower() == address.lower():
-                                        await process_transaction(tx_hash, address, is_outgoing=False)
-                                    
-                                    # Vérifier les transferts ERC20
-                                    try:
-                                        receipt = w3.eth.get_transaction_receipt(tx_hash)
-                                        if receipt and receipt['logs']:
-                                            for log in receipt['logs']:
-                                                # Vérifier si c'est un transfert ERC20 (Transfer event topic)
-                                                if len(log['topics']) == 3 and log['topics'][0].hex() == '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef':
-                                                    from_addr = '0x' + log['topics'][1].hex()[-40:]
-                                                    to_addr = '0x' + log['topics'][2].hex()[-40:]
-                                                    
-                                                    # Vérifier les transferts ERC20 entrants
-                                                    if to_addr.lower() == address.lower():
-                                                        await process_token_transfer(tx_hash, address, log, is_outgoing=False)
-                                                    # Vérifier les transferts ERC20 sortants
-                                                    elif from_addr.lower() == address.lower():
-                                                        await process_token_transfer(tx_hash, address, log, is_outgoing=True)
-                                    except Exception as e:
-                                        logger.error(f"Erreur lors de la vérification des transferts ERC20 pour {tx_hash}: {str(e)}")
-                                        continue
-                                        
-                        except Exception as e:
-                            logger.error(f"Erreur lors de la vérification du bloc {block_num}: {str(e)}")
-                            continue
-                    
-                    last_checked_block[address] = current_block
-                    
-                except Exception as e:
-                    logger.error(f"Erreur lors de la vérification de l'adresse {address}: {str(e)}")
-                    continue
+                    activities = await fetch_address_activity(
+                        [(address, start_block, end_block) for address, _, start_block, end_block in scans]
+                    )
+                except (asyncio.TimeoutError, ValueError) as e:
+                    activities = [e] * len(scans)
+
+                pending = []
+                for (address, tracking_config, start_block, end_block), activity in zip(scans, activities):
+                    # Adresse retirée ou re-trackée, ou curseur reculé par le worker pendant la requête : résultat obsolète
+                    if tracking_configs.get(address) is not tracking_config or tracking_config.last_block != start_block - 1:
+                        continue
+                    if isinstance(activity, Exception):
+                        # Réduire la plage sur timeout ou erreur du provider, puis réessayer
+                        if isinstance(activity, (asyncio.TimeoutError, ValueError)) and tracking_config.block_range > MIN_BLOCK_RANGE:
+                            tracking_config.block_range = max(MIN_BLOCK_RANGE, tracking_config.block_range // 2)
+                            logger.warning(f"Plage trop large pour {address} ({str(activity)}), réduction à {tracking_config.block_range} blocs")
+                            pending.append(address)
+                        else:
+                            logger.error(f"Erreur lors de la vérification de l'adresse {address}: {str(activity)}")
+                        continue
+
+                    # Les notifications partent en arrière-plan pour ne pas ralentir le scan ;
+                    # le worker valide le curseur persisté une fois l'envoi réussi
+                    notification_queue.put_nowait((address, tracking_config, start_block, end_block, activity))
+                    tracking_config.last_block = end_block
+                    tracking_config.block_range = min(max_block_range, tracking_config.block_range * 2)
+                    if end_block < current_block:
+                        pending.append(address)
             
+            cycles_since_save += 1
+            if cycles_since_save >= cursor_save_interval:
+                await data_manager.save_data_async()
+                await save_token_cache_async()
+                cycles_since_save = 0
+
             # Réinitialiser le compteur d'erreurs si tout s'est bien passé
             consecutive_errors = 0
-            # Ajuster le délai en fonction de la charge
+            # Ajuster le délai en fonction de la charge. C'est l'écart minimal entre deux cycles : le coût d'un cycle
+            # ne dépend pas de la taille des plages, newHeads sert seulement à sauter les cycles sans nouveau bloc
             sleep_time = base_sleep_time
             if len(data_manager.data) > 5:
                 sleep_time = base_sleep_time * 1.5
@@ -404,19 +1061,24 @@ async def track_address(ctx, address: str, name: str = None, *args):
         data_manager.add_address(checksum_address, name, config)
         
         # Construire le message de confirmation
-        filters = []
-        if config.get('token_address'):
-            filters.append(f"Token: {config['token_address']}")
-        if config.get('min_amount'):
-            filters.append(f"Min: {config['min_amount']} ETH")
-            
-        filter_text = " | ".join(filters) if filters else "Aucun filtre"
+        filter_text = format_filters(config)
         await ctx.send(f"✅ Tracking activé pour {name} ({checksum_address})\nFiltres: {filter_text}")
         
     except Exception as e:
         await ctx.send(f"❌ Erreur: {str(e)}")
         logger.error(f"Erreur lors du tracking de l'adresse {address}: {str(e)}")
 
+def format_filters(config: Dict) -> str:
+    """Décrit les filtres d'une adresse trackée pour l'affichage"""
+    filters = []
+    if config.get('token_address'):
+        filters.append(f"Token: {config['token_address']}")
+    if config.get('min_amount'):
+        # Le minimum est en unités du token filtré s'il y en a un, en ETH sinon
+        unit = "(unités du token)" if config.get('token_address') else "ETH"
+        filters.append(f"Min: {config['min_amount']} {unit}")
+    return " | ".join(filters) if filters else "Aucun filtre"
+
 @bot.command(name='untrack')
 async def untrack_address(ctx, identifier: str):
     """Retirer une adresse du tracking par son nom ou son adresse"""
@@ -428,6 +1090,9 @@ async def untrack_address(ctx, identifier: str):
     except Exception as e:
         await ctx.send(f"❌ Erreur: {str(e)}")
 
+# Nombre maximum de champs dans un embed Discord
+EMBED_MAX_FIELDS = 25
+
 @bot.command(name='list')
 async def list_addresses(ctx):
     """Lister les adresses trackées"""
@@ -436,24 +1101,18 @@ async def list_addresses(ctx):
             await ctx.send("❌ Aucune adresse n'est trackée")
             return
             
-        embed = discord.Embed(title="📋 Adresses trackées", color=0x00ff00)
-        
+        fields = []
         for address, config in data_manager.data.items():
             name = config.get('name', address[:6] + '...' + address[-4:])
-            filters = []
-            if config.get('token_address'):
-                filters.append(f"Token: {config['token_address']}")
-            if config.get('min_amount'):
-                filters.append(f"Min: {config['min_amount']} ETH")
-                
-            filter_text = " | ".join(filters) if filters else "Aucun filtre"
-            embed.add_field(
-                name=f"🔍 {name}",
-                value=f"`{address}`\n{filter_text}",
-                inline=False
-            )
-            
-        await ctx.send(embed=embed)
+            filter_text = format_filters(config)
+            fields.append((f"🔍 {name}", f"`{address}`\n{filter_text}"))
+
+        # Discord limite un embed à 25 champs : répartir la liste sur plusieurs messages
+        for start in range(0, len(fields), EMBED_MAX_FIELDS):
+            embed = discord.Embed(title="📋 Adresses trackées", color=0x00ff00)
+            for name, value in fields[start:start + EMBED_MAX_FIELDS]:
+                embed.add_field(name=name, value=value, inline=False)
+            await ctx.send(embed=embed)
     except Exception as e:
         await ctx.send(f"❌ Erreur: {str(e)}")
 
@@ -462,12 +1121,12 @@ async def test_connection(ctx):
     """Teste la connexion à Base et la capacité à récupérer les données"""
     try:
         # Test de connexion basique
-        is_connected = w3.is_connected()
+        is_connected = await w3.is_connected()
         connection_msg = f"📡 Connexion au réseau: {'✅' if is_connected else '❌'}"
         
         # Test de récupération du dernier bloc
         try:
-            latest_block = w3.eth.block_number
+            latest_block = await w3.eth.block_number
             block_msg = f"🔍 Dernier bloc: {latest_block}"
         except Exception as e:
             logger.error(f"Erreur bloc: {str(e)}")
@@ -475,7 +1134,7 @@ async def test_connection(ctx):
         
         # Test de récupération d'une transaction récente de manière simplifiée
         try:
-            block = w3.eth.get_block('latest')
+            block = await w3.eth.get_block('latest')
             if block and 'transactions' in block and block['transactions']:
                 tx_hash = block['transactions'][0].hex() if isinstance(block['transactions'][0], (bytes, bytearray)) else str(block['transactions'][0])
                 short_hash = f"{tx_hash[:10]}...{tx_hash[-8:]}"
@@ -487,16 +1146,10 @@ async def test_connection(ctx):
             tx_msg = "❌ Erreur lors de la récupération des transactions"
             
         # Test de l'API Alchemy
-        alchemy_api_key = os.getenv('ALCHEMY_API_KEY')
-        if alchemy_api_key:
-            try:
-                alchemy_url = f"https://base-mainnet.g.alchemy.com/v2/{alchemy_api_key}"
-                alchemy_w3 = Web3(Web3.HTTPProvider(alchemy_url))
-                is_alchemy_connected = alchemy_w3.is_connected()
-                alchemy_msg = f"🔌 Connexion Alchemy: {'✅' if is_alchemy_connected else '❌'}"
-            except Exception as e:
-                logger.error(f"Erreur Alchemy: {str(e)}")
-                alchemy_msg = "❌ Erreur de connexion Alchemy"
+        if ALCHEMY_URL:
+            # Réutilise le provider global plutôt que d'ouvrir une nouvelle connexion
+            is_alchemy_connected = is_connected and is_alchemy_provider()
+            alchemy_msg = f"🔌 Connexion Alchemy: {'✅' if is_alchemy_connected else '❌'}"
         else:
             alchemy_msg = "⚠️ Pas de clé Alchemy configurée"
         
@@ -521,27 +1174,19 @@ async def test_connection(ctx):
 async def alchemy_test(ctx):
     """Teste explicitement la connexion à Alchemy et affiche le résultat"""
     try:
-        # Configuration d'une connexion directe à Alchemy
-        alchemy_url = "https://base-mainnet.g.alchemy.com/v2/0mT-QZ3Jim1d81aTEh93YkE3UK8bpmTc"
-        w3_alchemy = Web3(Web3.HTTPProvider(
-            alchemy_url,
-            request_kwargs={
-                'timeout': 30,
-                'headers': {
-                    "Accept": "application/json",
-                    "Content-Type": "application/json"
-                }
-            }
-        ))
+        # Réutilise le provider global (session HTTP partagée) au lieu d'ouvrir une nouvelle connexion
+        if not is_alchemy_provider():
+            await ctx.send("⚠️ Le bot n'utilise pas Alchemy actuellement (provider de secours)")
+            return
 
         # Test de connexion basique
-        is_connected = w3_alchemy.is_connected()
+        is_connected = await w3.is_connected()
         if not is_connected:
             await ctx.send("❌ Impossible de se connecter à Alchemy")
             return
 
         # Récupération du bloc spécifique (comme dans l'exemple)
-        block = w3_alchemy.eth.get_block(123456)
+        block = await w3.eth.get_block(123456)
         
         # Formatage de la réponse
         response = f"""✅ **Test Alchemy réussi !**
@@ -552,7 +1197,7 @@ async def alchemy_test(ctx):
 • Timestamp: {block['timestamp']}
 • Nombre de transactions: {len(block['transactions'])}
 
-🌐 **URL**: `{alchemy_url}`"""
+🌐 **Hôte**: `{urlparse(w3.provider.endpoint_uri).netloc}`"""
         
         await ctx.send(response)
         
@@ -561,21 +1206,13 @@ async def alchemy_test(ctx):
         logger.error(error_msg)
         await ctx.send(error_msg)
 
-async def process_transaction(tx_hash: str, address: str, is_outgoing: bool = True):
-    """Traite une transaction et envoie une notification Discord"""
+async def process_transaction(tx_hash: str, address: str, tx: Dict, receipt: Dict, is_outgoing: bool = True) -> Optional[discord.Embed]:
+    """Traite une transaction et construit son embed de notification Discord (None si rien à notifier)"""
     try:
-        # Vérifier si la transaction a déjà été traitée
-        if data_manager.is_tx_processed(tx_hash):
+        # Vérifier si la transaction a déjà été notifiée pour cette adresse
+        if data_manager.is_tx_processed(notification_key(address, tx_hash)):
             return
 
-        # Récupération des détails de la transaction
-        tx = w3.eth.get_transaction(tx_hash)
-        receipt = w3.eth.get_transaction_receipt(tx_hash)
-        
-        if not tx or not receipt:
-            logger.warning(f"Transaction {tx_hash} introuvable")
-            return
-            
         # Vérification du statut
         if receipt['status'] != 1:
             logger.info(f"Transaction {tx_hash} a échoué, pas de notification")
@@ -584,24 +1221,26 @@ async def process_transaction(tx_hash: str, address: str, is_outgoing: bool = Tr
         # Récupérer le nom de l'adresse
         address_name = data_manager.get_name(address)
 
+        # Une seule lecture de l'horloge pour l'horodatage et le pied de page
+        now = datetime.datetime.now(datetime.timezone.utc)
+
         # Création de l'embed avec une barre verte sur le côté
         embed = discord.Embed(
             title=f"🔄 Nouvelle tx de {address_name}",
             color=0x00ff00,
-            timestamp=datetime.datetime.utcnow()
+            timestamp=now
         )
 
         # Type de transaction
-        direction = "envoyée" if is_outgoing else "reçue"
         embed.add_field(
             name="Type",
-            value=f"Transaction {direction} {'➡️' if is_outgoing else '⬅️'}",
+            value=TX_TYPE_LABELS[is_outgoing],
             inline=False
         )
 
-        # Montant ETH
-        value_eth = w3.from_wei(tx['value'], 'ether')
-        if value_eth > 0:
+        # Montant ETH (division flottante suffisante pour un affichage à 4 décimales, sans passer par Decimal)
+        if tx['value'] > 0:
+            value_eth = tx['value'] / WEI_PER_ETH
             embed.add_field(
                 name="Montant ETH",
                 value=f"{value_eth:.4f} ETH",
@@ -625,66 +1264,55 @@ async def process_transaction(tx_hash: str, address: str, is_outgoing: bool = Tr
         # Lien Basescan
         embed.add_field(
             name="🔍 Explorer",
-            value=f"[Voir la transaction sur Basescan](https://basescan.org/tx/{tx_hash})",
+            value=EXPLORER_LINK_TEMPLATE.format(tx_hash),
             inline=False
         )
 
         # Timestamp en bas
-        embed.set_footer(text=f"Aujourd'hui à {datetime.datetime.now().strftime('%H:%M')}")
+        embed.set_footer(text=f"Aujourd'hui à {now.astimezone().strftime('%H:%M')}")
         
-        # Envoi de la notification
-        if address in data_manager.data and 'channel_id' in data_manager.data[address]:
-            channel_id = data_manager.data[address]['channel_id']
-            channel = bot.get_channel(channel_id)
-            if channel:
-                await channel.send(embed=embed)
-                logger.info(f"Notification envoyée pour la transaction {tx_hash}")
-                # Marquer la transaction comme traitée
-                data_manager.mark_tx_processed(tx_hash)
-            else:
-                logger.error(f"Canal Discord {channel_id} introuvable pour l'adresse {address}")
-        else:
-            logger.error(f"Configuration de canal manquante pour l'adresse {address}")
-            
+        return embed
+
     except Exception as e:
         logger.error(f"Erreur lors du traitement de la transaction {tx_hash}: {str(e)}")
+        return None
 
-async def process_token_transfer(tx_hash: str, address: str, log: dict, is_outgoing: bool = True):
-    """Traite un transfert de token ERC20 et envoie une notification Discord"""
+async def process_token_transfer(tx_hash: str, address: str, log: dict, token_info: Dict, is_outgoing: bool = True, min_amount: float = None) -> Optional[discord.Embed]:
+    """Traite un transfert de token ERC20 et construit son embed de notification Discord"""
     try:
-        # Récupérer les informations du token
-        token_address = log['address']
-        token_contract = w3.eth.contract(address=token_address, abi=ERC20_ABI)
-        
-        try:
-            token_name = token_contract.functions.name().call()
-            token_symbol = token_contract.functions.symbol().call()
-            token_decimals = token_contract.functions.decimals().call()
-        except Exception as e:
-            logger.error(f"Erreur lors de la récupération des infos du token {token_address}: {str(e)}")
-            token_name = "Unknown Token"
+        # Informations du token obtenues par batch (vides si l'appel Multicall3 a échoué)
+        if token_info:
+            token_symbol = token_info['symbol']
+            token_decimals = token_info['decimals']
+        else:
             token_symbol = "???"
             token_decimals = 18
 
         # Décoder le montant du transfert
-        amount = int(log['data'], 16)
+        # Décodage direct des octets big-endian, sans repasser par une chaîne hexadécimale
+        amount = int.from_bytes(log['data'], 'big')
         token_amount = amount / (10 ** token_decimals)
+        # Montant sous le minimum configuré : rien à construire
+        if min_amount and token_amount < min_amount:
+            return None
 
         # Récupérer le nom de l'adresse trackée
         address_name = data_manager.get_name(address)
 
+        # Une seule lecture de l'horloge pour l'horodatage et le pied de page
+        now = datetime.datetime.now(datetime.timezone.utc)
+
         # Création de l'embed
         embed = discord.Embed(
             title=f"🔄 Nouvelle tx de {address_name}",
             color=0x00ff00,
-            timestamp=datetime.datetime.utcnow()
+            timestamp=now
         )
 
         # Type de transaction
-        direction = "envoyée" if is_outgoing else "reçue"
         embed.add_field(
             name="Type",
-            value=f"Transaction {direction} {'➡️' if is_outgoing else '⬅️'}",
+            value=TX_TYPE_LABELS[is_outgoing],
             inline=False
         )
 
@@ -695,47 +1323,37 @@ async def process_token_transfer(tx_hash: str, address: str, log: dict, is_outgo
             inline=False
         )
 
-        # Destinataire/Expéditeur
-        from_addr = '0x' + log['topics'][1].hex()[-40:]
-        to_addr = '0x' + log['topics'][2].hex()[-40:]
-        
+        # Destinataire/Expéditeur : seuls les 20 derniers octets du topic concerné sont convertis
+        counterparty = '0x' + bytes(log['topics'][2 if is_outgoing else 1][-20:]).hex()
+
         if is_outgoing:
             embed.add_field(
                 name="Destinataire",
-                value=f"{to_addr}",
+                value=f"{counterparty}",
                 inline=False
             )
         else:
             embed.add_field(
                 name="Expéditeur",
-                value=f"{from_addr}",
+                value=f"{counterparty}",
                 inline=False
             )
 
         # Lien Basescan
         embed.add_field(
             name="🔍 Explorer",
-            value=f"[Voir la transaction sur Basescan](https://basescan.org/tx/{tx_hash})",
+            value=EXPLORER_LINK_TEMPLATE.format(tx_hash),
             inline=False
         )
 
         # Timestamp en bas
-        embed.set_footer(text=f"Aujourd'hui à {datetime.datetime.now().strftime('%H:%M')}")
+        embed.set_footer(text=f"Aujourd'hui à {now.astimezone().strftime('%H:%M')}")
         
-        # Envoi de la notification
-        if address in data_manager.data and 'channel_id' in data_manager.data[address]:
-            channel_id = data_manager.data[address]['channel_id']
-            channel = bot.get_channel(channel_id)
-            if channel:
-                await channel.send(embed=embed)
-                logger.info(f"Notification envoyée pour le transfert de token {tx_hash}")
-            else:
-                logger.error(f"Canal Discord {channel_id} introuvable pour l'adresse {address}")
-        else:
-            logger.error(f"Configuration de canal manquante pour l'adresse {address}")
-            
+        return embed
+
     except Exception as e:
         logger.error(f"Erreur lors du traitement du transfert de token {tx_hash}: {str(e)}")
+        return None
 
 @bot.command(name='importbanlist')
 async def import_banlist(ctx):
@@ -756,8 +1374,8 @@ async def import_banlist(ctx):
         # Télécharger et lire le fichier
         content = await attachment.read()
         try:
-            banlist_data = json.loads(content)
-        except json.JSONDecodeError:
+            banlist_data = orjson.loads(content)
+        except orjson.JSONDecodeError:
             await ctx.send("❌ Le fichier n'est pas un JSON valide")
             return
 
@@ -775,8 +1393,8 @@ async def import_banlist(ctx):
         banlist_data = [str(x) for x in banlist_data]
 
         # Sauvegarder la banlist
-        with open('banlist.json', 'w') as f:
-            json.dump(banlist_data, f, indent=4)
+        with open('banlist.json', 'wb') as f:
+            f.write(orjson.dumps(banlist_data, option=orjson.OPT_INDENT_2))
 
         await ctx.send(f"✅ Banlist mise à jour avec succès ({len(banlist_data)} éléments)")
         logger.info(f"Banlist mise à jour par {ctx.author.name} ({len(banlist_data)} éléments)")
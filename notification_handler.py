@@ -1,6 +1,45 @@
 import discord
+import logging
 from typing import Dict
-from datetime import datetime
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Couleur, titre et libellé par type de transaction (construits une seule fois au chargement)
+TX_TYPE_COLORS = {
+    'eth_transfer': 0x3498db,      # Bleu
+    'token_transfer': 0x2ecc71,    # Vert
+    'contract_interaction': 0xe67e22,  # Orange
+    'contract_creation': 0x9b59b6   # Violet
+}
+DEFAULT_TX_COLOR = 0x95a5a6
+
+TX_TYPE_TITLES = {
+    'eth_transfer': '💸 Transfert ETH',
+    'token_transfer': '🪙 Transfert de Token',
+    'contract_interaction': '📝 Interaction Contract',
+    'contract_creation': '🏗️ Création de Contract'
+}
+
+TX_TYPE_FORMATS = {
+    'eth_transfer': 'Transfert ETH',
+    'token_transfer': 'Transfert Token',
+    'contract_interaction': 'Interaction Contract',
+    'contract_creation': 'Création Contract'
+}
+
+# Liens Basescan
+BASESCAN_ADDRESS_URL = 'https://basescan.org/address/'
+BASESCAN_TX_URL = 'https://basescan.org/tx/'
+
+def format_address_link(address: str, abbreviated: bool = True) -> str:
+    """Formate une adresse (abrégée par défaut) avec un lien vers Basescan"""
+    label = f"{address[:6]}...{address[-4:]}" if abbreviated else address
+    return f"[{label}]({BASESCAN_ADDRESS_URL}{address})"
+
+def format_tx_link(tx_hash: str, label: str = None) -> str:
+    """Formate un lien vers une transaction sur Basescan"""
+    return f"[{label or tx_hash}]({BASESCAN_TX_URL}{tx_hash})"
 
 class NotificationHandler:
     def __init__(self, bot):
@@ -11,25 +50,25 @@ class NotificationHandler:
         try:
             channel = self.bot.get_channel(channel_id)
             if not channel:
-                print(f"Canal {channel_id} non trouvé")
+                logger.error(f"Canal {channel_id} non trouvé")
                 return
 
             # Créer l'embed
             embed = discord.Embed(
                 title="🔔 Nouvelle Transaction Détectée",
-                description=f"Hash: [{tx_info['hash']}](https://basescan.org/tx/{tx_info['hash']})",
+                description=f"Hash: {format_tx_link(tx_info['hash'])}",
                 color=0x3498db
             )
 
             # Ajouter les informations de base
             embed.add_field(
                 name="📤 De",
-                value=f"[{tx_info['from']}](https://basescan.org/address/{tx_info['from']})",
+                value=format_address_link(tx_info['from'], abbreviated=False),
                 inline=True
             )
             embed.add_field(
                 name="📥 À",
-                value=f"[{tx_info['to']}](https://basescan.org/address/{tx_info['to']})",
+                value=format_address_link(tx_info['to'], abbreviated=False),
                 inline=True
             )
             
@@ -47,8 +86,8 @@ class NotificationHandler:
                 for transfer in tx_info['token_transfers']:
                     token_text += f"• {transfer['value']} {transfer['token_symbol']}"
                     token_text += f" ({transfer['token_name']})\n"
-                    token_text += f"  De: [{transfer['from']}](https://basescan.org/address/{transfer['from']})\n"
-                    token_text += f"  À: [{transfer['to']}](https://basescan.org/address/{transfer['to']})\n\n"
+                    token_text += f"  De: {format_address_link(transfer['from'], abbreviated=False)}\n"
+                    token_text += f"  À: {format_address_link(transfer['to'], abbreviated=False)}\n\n"
                 
                 embed.add_field(
                     name="🔄 Transferts de Tokens",
@@ -64,110 +103,70 @@ class NotificationHandler:
             )
 
             # Ajouter le timestamp
-            embed.set_footer(text=f"Block #{tx_info['block_number']} • {datetime.fromtimestamp(tx_info['timestamp'])}")
+            embed.set_footer(text=f"Block #{tx_info['block_number']} • {datetime.fromtimestamp(tx_info['timestamp'], tz=timezone.utc)}")
 
             await channel.send(embed=embed)
-            print(f"Notification envoyée dans le canal {channel_id}")
+            logger.debug("Notification envoyée dans le canal %s", channel_id)
 
         except Exception as e:
-            print(f"Erreur lors de l'envoi de la notification: {str(e)}")
+            logger.error(f"Erreur lors de l'envoi de la notification: {str(e)}")
 
     def _create_embed(self, tx_info: Dict) -> discord.Embed:
         """Crée un embed Discord pour la notification"""
-        print("Création de l'embed pour la notification")
-        # Définir la couleur selon le type de transaction
-        color_map = {
-            'eth_transfer': 0x3498db,      # Bleu
-            'token_transfer': 0x2ecc71,    # Vert
-            'contract_interaction': 0xe67e22,  # Orange
-            'contract_creation': 0x9b59b6   # Violet
-        }
-        
-        color = color_map.get(tx_info['type'], 0x95a5a6)
-        print(f"Couleur sélectionnée: {color}")
-        
+        tx_type = tx_info['type']
         embed = discord.Embed(
-            title=self._get_title(tx_info),
-            color=color,
-            timestamp=datetime.fromtimestamp(tx_info['timestamp'])
+            title=TX_TYPE_TITLES.get(tx_type, '🔔 Nouvelle Transaction'),
+            color=TX_TYPE_COLORS.get(tx_type, DEFAULT_TX_COLOR),
+            timestamp=datetime.fromtimestamp(tx_info['timestamp'], tz=timezone.utc)
         )
-        print(f"Titre de l'embed: {self._get_title(tx_info)}")
 
         # Ajouter les informations de base
         embed.add_field(
             name="Type",
-            value=self._format_type(tx_info['type']),
+            value=TX_TYPE_FORMATS.get(tx_type, tx_type),
             inline=True
         )
-        print(f"Type ajouté: {self._format_type(tx_info['type'])}")
         
         embed.add_field(
             name="Statut",
             value="✅ Succès" if tx_info['status'] == 'success' else "❌ Échec",
             inline=True
         )
-        print(f"Statut ajouté: {tx_info['status']}")
 
         # Ajouter les informations spécifiques selon le type
-        if tx_info['type'] == 'eth_transfer':
+        if tx_type == 'eth_transfer':
             embed.add_field(
                 name="Montant",
                 value=f"{tx_info['value']:.4f} ETH",
                 inline=True
             )
-            print(f"Montant ETH ajouté: {tx_info['value']:.4f}")
-        elif tx_info['type'] == 'token_transfer':
+        elif tx_type == 'token_transfer':
             if 'token_symbol' in tx_info:
                 embed.add_field(
                     name="Token",
                     value=f"{tx_info['token_symbol']}",
                     inline=True
                 )
-                print(f"Symbole du token ajouté: {tx_info['token_symbol']}")
 
         # Ajouter les liens
         embed.add_field(
             name="Transaction",
-            value=f"[Voir sur Basescan](https://basescan.org/tx/{tx_info['hash']})",
+            value=format_tx_link(tx_info['hash'], "Voir sur Basescan"),
             inline=False
         )
-        print(f"Lien Basescan ajouté pour la transaction {tx_info['hash']}")
 
         # Ajouter les adresses
         embed.add_field(
             name="De",
-            value=f"[{tx_info['from'][:6]}...{tx_info['from'][-4:]}](https://basescan.org/address/{tx_info['from']})",
+            value=format_address_link(tx_info['from']),
             inline=True
         )
-        print(f"Adresse source ajoutée: {tx_info['from']}")
         
         if tx_info['to']:
             embed.add_field(
                 name="Vers",
-                value=f"[{tx_info['to'][:6]}...{tx_info['to'][-4:]}](https://basescan.org/address/{tx_info['to']})",
+                value=format_address_link(tx_info['to']),
                 inline=True
             )
-            print(f"Adresse destination ajoutée: {tx_info['to']}")
 
-        print("Embed créé avec succès")
         return embed
-
-    def _get_title(self, tx_info: Dict) -> str:
-        """Génère le titre de la notification"""
-        type_titles = {
-            'eth_transfer': '💸 Transfert ETH',
-            'token_transfer': '🪙 Transfert de Token',
-            'contract_interaction': '📝 Interaction Contract',
-            'contract_creation': '🏗️ Création de Contract'
-        }
-        return type_titles.get(tx_info['type'], '🔔 Nouvelle Transaction')
-
-    def _format_type(self, tx_type: str) -> str:
-        """Formate le type de transaction pour l'affichage"""
-        type_formats = {
-            'eth_transfer': 'Transfert ETH',
-            'token_transfer': 'Transfert Token',
-            'contract_interaction': 'Interaction Contract',
-            'contract_creation': 'Création Contract'
-        }
-        return type_formats.get(tx_type, tx_type) 
\ No newline at end of file
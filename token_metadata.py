@@ -0,0 +1,90 @@
+from eth_abi import decode, encode
+from eth_utils import to_checksum_address
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from functools import lru_cache
+import logging
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Appels de métadonnées ERC20 : (clé, sélecteur de fonction, type ABI retourné)
+TOKEN_INFO_CALLS = (
+    ('name', bytes.fromhex('06fdde03'), 'string'),
+    ('symbol', bytes.fromhex('95d89b41'), 'string'),
+    ('decimals', bytes.fromhex('313ce567'), 'uint8')
+)
+# Contrat Multicall3 (même adresse sur toutes les chaînes EVM, dont Base) et sélecteur de aggregate3
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+AGGREGATE3_SELECTOR = bytes.fromhex('82ad56cb')
+
+# Cache LRU des métadonnées (immuables) par adresse checksum, commun au bot et au gestionnaire de transactions
+TOKEN_CACHE_SIZE = 4096
+token_cache: 'OrderedDict[str, Dict]' = OrderedDict()
+# Nouveaux tokens depuis la dernière sauvegarde, la persistance étant à la charge du bot
+token_cache_dirty = False
+
+def get_cached_token_info(token_address: str) -> Optional[Dict]:
+    """Retourne les métadonnées en cache d'un token (adresse checksum), None si absent"""
+    token_info = token_cache.get(token_address)
+    if token_info is not None:
+        token_cache.move_to_end(token_address)
+    return token_info
+
+def cache_token_info(token_address: str, token_info: Dict):
+    """Met en cache les métadonnées d'un token (adresse checksum) en évinçant la plus ancienne"""
+    global token_cache_dirty
+    token_cache[token_address] = token_info
+    token_cache_dirty = True
+    if len(token_cache) > TOKEN_CACHE_SIZE:
+        token_cache.popitem(last=False)
+
+def restore_token_cache(content: bytes):
+    """Recharge le cache depuis un contenu sauvegardé par snapshot_token_cache"""
+    token_cache.update(orjson.loads(content))
+
+def snapshot_token_cache() -> Optional[bytes]:
+    """Sérialise le cache s'il a changé depuis la dernière sauvegarde, None sinon"""
+    global token_cache_dirty
+    if not token_cache_dirty:
+        return None
+    token_cache_dirty = False
+    return orjson.dumps(token_cache)
+
+def mark_token_cache_dirty():
+    """Redemande une sauvegarde du cache après une écriture en échec"""
+    global token_cache_dirty
+    token_cache_dirty = True
+
+@lru_cache(maxsize=4096)
+def to_checksum(address: str) -> str:
+    """Version mise en cache de to_checksum_address (keccak recalculé à chaque appel sinon)"""
+    return to_checksum_address(address)
+
+def encode_token_info_calls(token_addresses: List[str]) -> bytes:
+    """Encode l'appel aggregate3 demandant les métadonnées de plusieurs tokens en un seul eth_call"""
+    # allowFailure à True : un token non conforme n'empêche pas de décoder les autres
+    calls = [
+        (token_address, True, selector)
+        for token_address in token_addresses
+        for _, selector, _ in TOKEN_INFO_CALLS
+    ]
+    return AGGREGATE3_SELECTOR + encode(['(address,bool,bytes)[]'], [calls])
+
+def decode_token_infos(token_addresses: List[str], result: bytes) -> Dict[str, Optional[Dict]]:
+    """Décode le retour d'aggregate3 en métadonnées par token, None pour ceux dont un appel a échoué"""
+    results = decode(['(bool,bytes)[]'], result)[0]
+    token_infos = {}
+    for index, token_address in enumerate(token_addresses):
+        token_results = results[index * len(TOKEN_INFO_CALLS):(index + 1) * len(TOKEN_INFO_CALLS)]
+        try:
+            token_info = {}
+            for (key, _, abi_type), (success, return_data) in zip(TOKEN_INFO_CALLS, token_results):
+                if not success:
+                    raise ValueError(f"appel {key}() en échec")
+                token_info[key] = decode([abi_type], return_data)[0]
+            token_infos[token_address] = token_info
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des infos du token {token_address}: {str(e)}")
+            token_infos[token_address] = None
+    return token_infos
@@ -1,39 +1,65 @@
-from web3 import Web3
-from typing import Dict, Optional
-import json
-from eth_abi.codec import ABICodec
-from eth_utils import to_checksum_address
+from web3 import AsyncWeb3
+from hexbytes import HexBytes
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from decimal import Decimal
+import asyncio
+import logging
+from token_metadata import (
+    MULTICALL3_ADDRESS, cache_token_info, decode_token_infos, encode_token_info_calls, get_cached_token_info, to_checksum
+)
+
+logger = logging.getLogger(__name__)
+
+# Nombre d'horodatages de blocs gardés en cache
+BLOCK_CACHE_SIZE = 256
+
+# Conversions wei -> ETH / Gwei en Decimal, comme from_wei mais sans résolution de l'unité à chaque appel
+WEI_PER_ETH = Decimal(10 ** 18)
+WEI_PER_GWEI = Decimal(10 ** 9)
+
+# Topic de l'event ERC20 Transfer(address,address,uint256), comparé directement aux octets des logs
+TRANSFER_EVENT_TOPIC = bytes.fromhex('ddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef')
+
+# Type de transaction par sélecteur (4 premiers octets de l'input) : une seule recherche dans le dict
+TX_TYPE_BY_SELECTOR = {
+    bytes.fromhex('a9059cbb'): 'token_transfer'  # transfer(address,uint256)
+}
 
 class TransactionHandler:
-    def __init__(self, w3: Web3):
+    def __init__(self, w3: AsyncWeb3):
         self.w3 = w3
-        self.abi_codec = ABICodec(w3.codec)
-        self.erc20_abi = json.loads('''[
-            {"constant":true,"inputs":[],"name":"name","outputs":[{"name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"},
-            {"constant":true,"inputs":[],"name":"symbol","outputs":[{"name":"","type":"string"}],"payable":false,"stateMutability":"view","type":"function"},
-            {"constant":true,"inputs":[],"name":"decimals","outputs":[{"name":"","type":"uint8"}],"payable":false,"stateMutability":"view","type":"function"}
-        ]''')
+        # Métadonnées dans le cache commun de token_metadata ; requêtes en cours pour ne pas dupliquer les appels
+        self.token_info_tasks: Dict[str, asyncio.Task] = {}
+        # Cache LRU numéro de bloc -> horodatage, partagé par les transactions d'un même bloc
+        self.block_timestamps: OrderedDict = OrderedDict()
+        self.block_timestamp_tasks: Dict[int, asyncio.Task] = {}
 
     async def process_transaction(self, tx_hash: str, config: Dict) -> Optional[Dict]:
         """Traite une transaction et retourne les informations pertinentes"""
         try:
-            print(f"\nTraitement détaillé de la transaction {tx_hash}")
+            logger.debug("Traitement détaillé de la transaction %s", tx_hash)
             
             # Récupérer la transaction
-            tx = self.w3.eth.get_transaction(tx_hash)
+            tx = await self.w3.eth.get_transaction(tx_hash)
             if not tx:
-                print(f"Transaction {tx_hash} non trouvée")
+                logger.warning(f"Transaction {tx_hash} non trouvée")
+                return None
+
+            # Les filtres ne portent que sur la transaction : les appliquer avant de demander le reçu et le bloc
+            filters = {key: config[key] for key in ('token_address', 'min_amount') if key in config}
+            if not self._matches_filters(tx, filters):
                 return None
             
             # Récupérer le reçu de la transaction
-            receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+            receipt = await self.w3.eth.get_transaction_receipt(tx_hash)
             if not receipt:
-                print(f"Reçu de transaction {tx_hash} non trouvé")
+                logger.warning(f"Reçu de transaction {tx_hash} non trouvé")
                 return None
             
             # Vérifier si la transaction est réussie
             if not receipt['status']:
-                print(f"Transaction {tx_hash} a échoué")
+                logger.debug("Transaction %s a échoué", tx_hash)
                 return None
             
             # Initialiser les informations de base
@@ -41,120 +67,173 @@ class TransactionHandler:
                 'hash': tx_hash,
                 'from': tx['from'],
                 'to': tx['to'],
-                'value': self.w3.from_wei(int(tx['value']), 'ether'),
+                'value': Decimal(tx['value']) / WEI_PER_ETH,
                 'block_number': receipt['blockNumber'],
-                'timestamp': self.w3.eth.get_block(receipt['blockNumber'])['timestamp'],
+                'timestamp': await self._get_block_timestamp(receipt['blockNumber']),
                 'gas_used': receipt['gasUsed'],
-                'gas_price': self.w3.from_wei(int(tx['gasPrice']), 'gwei'),
+                'gas_price': Decimal(tx['gasPrice']) / WEI_PER_GWEI,
                 'status': 'success',
                 'token_transfers': []
             }
             
             # Analyser les logs pour les transferts de tokens
-            if receipt.get('logs'):
-                for log in receipt['logs']:
-                    if len(log['topics']) >= 3 and log['topics'][0].hex() == '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef':
-                        # Décoder les adresses from/to depuis les topics
-                        from_addr = '0x' + log['topics'][1].hex()[-40:]
-                        to_addr = '0x' + log['topics'][2].hex()[-40:]
-                        token_contract = log['address']
+            transfer_logs = [
+                log for log in receipt.get('logs') or []
+                if len(log['topics']) >= 3 and log['topics'][0] == TRANSFER_EVENT_TOPIC
+            ]
+            if transfer_logs:
+                # Métadonnées de tous les tokens de la transaction en un seul appel Multicall3
+                token_infos = await self._get_token_infos([log['address'] for log in transfer_logs])
+                for log in transfer_logs:
+                    # Décoder les adresses from/to depuis les 20 derniers octets des topics
+                    from_addr = '0x' + bytes(log['topics'][1][-20:]).hex()
+                    to_addr = '0x' + bytes(log['topics'][2][-20:]).hex()
+                    token_contract = log['address']
+                    
+                    # Décoder la valeur du transfert (uint256 big-endian)
+                    value = int.from_bytes(log['data'], 'big')
+                    
+                    # Récupérer les informations du token
+                    try:
+                        token_info = token_infos[to_checksum(token_contract.lower())]
+                        decimals = token_info.get('decimals', 18)
+                        token_value = value / (10 ** decimals)
+                        
+                        transfer_info = {
+                            'token_address': token_contract,
+                            'token_name': token_info.get('name', 'Unknown Token'),
+                            'token_symbol': token_info.get('symbol', '???'),
+                            'from': from_addr,
+                            'to': to_addr,
+                            'value': token_value,
+                            'raw_value': value
+                        }
                         
-                        # Décoder la valeur du transfert
-                        value = int(log['data'], 16)
+                        tx_info['token_transfers'].append(transfer_info)
+                        logger.debug("Transfert de token détecté: %s - %s", transfer_info['token_symbol'], transfer_info['value'])
                         
-                        # Récupérer les informations du token
-                        try:
-                            token_info = await self._get_token_info(token_contract)
-                            decimals = token_info.get('token_decimals', 18)
-                            token_value = value / (10 ** decimals)
-                            
-                            transfer_info = {
-                                'token_address': token_contract,
-                                'token_name': token_info.get('token_name', 'Unknown Token'),
-                                'token_symbol': token_info.get('token_symbol', '???'),
-                                'from': from_addr,
-                                'to': to_addr,
-                                'value': token_value,
-                                'raw_value': value
-                            }
-                            
-                            tx_info['token_transfers'].append(transfer_info)
-                            print(f"Transfert de token détecté: {transfer_info['token_symbol']} - {transfer_info['value']}")
-                            
-                        except Exception as e:
-                            print(f"Erreur lors de la récupération des informations du token {token_contract}: {str(e)}")
-                            continue
+                    except Exception as e:
+                        logger.error(f"Erreur lors de la récupération des informations du token {token_contract}: {str(e)}")
+                        continue
             
-            print(f"Transaction {tx_hash} traitée avec succès")
+            logger.debug("Transaction %s traitée avec succès", tx_hash)
             return tx_info
 
         except Exception as e:
-            print(f"Erreur lors du traitement de la transaction {tx_hash}: {str(e)}")
+            logger.error(f"Erreur lors du traitement de la transaction {tx_hash}: {str(e)}")
             return None
 
-    def _matches_filters(self, tx: Dict, receipt: Dict, filters: Dict) -> bool:
+    async def _get_block_timestamp(self, block_number: int) -> int:
+        """Récupère l'horodatage d'un bloc, depuis le cache si possible"""
+        timestamp = self.block_timestamps.get(block_number)
+        if timestamp is not None:
+            self.block_timestamps.move_to_end(block_number)
+            return timestamp
+
+        # Transactions du même bloc traitées en parallèle : un seul get_block pour toutes
+        task = self.block_timestamp_tasks.get(block_number)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_block_timestamp(block_number))
+            self.block_timestamp_tasks[block_number] = task
+            task.add_done_callback(lambda _: self.block_timestamp_tasks.pop(block_number, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_block_timestamp(self, block_number: int) -> int:
+        """Récupère l'horodatage d'un bloc (en-tête seul, sans ses transactions) et le met en cache"""
+        timestamp = (await self.w3.eth.get_block(block_number, full_transactions=False))['timestamp']
+        self.block_timestamps[block_number] = timestamp
+        if len(self.block_timestamps) > BLOCK_CACHE_SIZE:
+            self.block_timestamps.popitem(last=False)
+        return timestamp
+
+    def _matches_filters(self, tx: Dict, filters: Dict) -> bool:
         """Vérifie si la transaction correspond aux filtres configurés"""
         if not filters:
-            print("Aucun filtre configuré, transaction acceptée")
             return True
 
         # Vérifier les filtres de token
         if 'token_address' in filters:
-            print(f"Vérification du filtre token_address: {filters['token_address']}")
             if tx['to'] and tx['to'].lower() != filters['token_address'].lower():
-                print(f"Adresse du token ne correspond pas: {tx['to']} != {filters['token_address']}")
+                logger.debug("Adresse du token ne correspond pas: %s != %s", tx['to'], filters['token_address'])
                 return False
 
         # Vérifier les filtres de montant minimum
         if 'min_amount' in filters:
-            print(f"Vérification du filtre min_amount: {filters['min_amount']}")
-            tx_value = float(self.w3.from_wei(tx['value'], 'ether'))
+            tx_value = float(Decimal(tx['value']) / WEI_PER_ETH)
             if tx_value < float(filters['min_amount']):
-                print(f"Montant insuffisant: {tx_value} < {filters['min_amount']}")
+                logger.debug("Montant insuffisant: %s < %s", tx_value, filters['min_amount'])
                 return False
 
-        print("Transaction correspond à tous les filtres")
         return True
 
     def _determine_transaction_type(self, tx: Dict, receipt: Dict) -> str:
         """Détermine le type de transaction"""
-        print("Détermination du type de transaction")
-        print(f"Input data: {tx['input']}")
-        
         if not tx['to']:
-            print("Transaction de création de contrat détectée")
             return 'contract_creation'
         
-        # Vérifier si c'est un transfert de token ERC20
-        if tx['input'].startswith('0xa9059cbb'):
-            print("Transfert de token ERC20 détecté")
-            return 'token_transfer'
+        # web3 fournit l'input en HexBytes : comparer les octets sans réencoder tout le calldata en hexadécimal
+        tx_input = HexBytes(tx['input'])
+
+        # Vérifier si le sélecteur correspond à un type connu (transfert de token ERC20)
+        tx_type = TX_TYPE_BY_SELECTOR.get(tx_input[:4])
+        if tx_type:
+            return tx_type
         
         # Vérifier si c'est une interaction avec un contrat
-        if receipt.get('contractAddress') or len(tx['input']) > 2:
-            print("Interaction avec un contrat détectée")
+        if receipt.get('contractAddress') or len(tx_input) > 0:
             return 'contract_interaction'
         
-        print("Transfert simple d'ETH détecté")
         return 'eth_transfer'
 
-    async def _get_token_info(self, token_address: str) -> Dict:
-        """Récupère les informations d'un token ERC20"""
+    async def _get_token_infos(self, token_addresses: List[str]) -> Dict[str, Dict]:
+        """Récupère les informations de plusieurs tokens ERC20, indexées par adresse checksum"""
+        token_infos = {}
+        pending_tasks = {}
+        missing = []
+        for checksum_address in dict.fromkeys(to_checksum(token_address.lower()) for token_address in token_addresses):
+            token_info = get_cached_token_info(checksum_address)
+            if token_info is not None:
+                token_infos[checksum_address] = token_info
+            elif checksum_address in self.token_info_tasks:
+                # Déjà demandé par un autre transfert : attendre la même requête
+                pending_tasks[checksum_address] = self.token_info_tasks[checksum_address]
+            else:
+                missing.append(checksum_address)
+
+        if missing:
+            task = asyncio.ensure_future(self._fetch_token_infos(missing))
+
+            def forget_task(_):
+                for checksum_address in missing:
+                    self.token_info_tasks.pop(checksum_address, None)
+
+            task.add_done_callback(forget_task)
+            for checksum_address in missing:
+                self.token_info_tasks[checksum_address] = task
+                pending_tasks[checksum_address] = task
+
+        for checksum_address, task in pending_tasks.items():
+            token_infos[checksum_address] = (await asyncio.shield(task)).get(checksum_address, {})
+        return token_infos
+
+    async def _fetch_token_infos(self, checksum_addresses: List[str]) -> Dict[str, Dict]:
+        """Interroge les contrats ERC20 en un seul eth_call Multicall3 et met leurs informations en cache"""
+        logger.debug("Récupération des informations de %s token(s) via Multicall3", len(checksum_addresses))
         try:
-            # S'assurer que l'adresse est au format checksum
-            checksum_address = to_checksum_address(token_address)
-            print(f"Récupération des informations du token à l'adresse {checksum_address}")
-            
-            contract = self.w3.eth.contract(
-                address=checksum_address,
-                abi=self.erc20_abi
-            )
-            
-            return {
-                'token_name': await contract.functions.name().call(),
-                'token_symbol': await contract.functions.symbol().call(),
-                'token_decimals': await contract.functions.decimals().call()
-            }
+            result = await self.w3.eth.call({
+                'to': MULTICALL3_ADDRESS,
+                'data': encode_token_info_calls(checksum_addresses)
+            })
+            fetched = decode_token_infos(checksum_addresses, result)
         except Exception as e:
-            print(f"Erreur lors de la récupération des informations du token: {e}")
-            return {} 
\ No newline at end of file
+            # Pas de mise en cache en cas d'erreur : les tokens seront réessayés au prochain transfert
+            logger.error(f"Erreur lors de la récupération des informations des tokens: {e}")
+            return {}
+
+        token_infos = {}
+        for checksum_address, token_info in fetched.items():
+            if token_info is None:
+                continue
+            token_infos[checksum_address] = token_info
+            cache_token_info(checksum_address, token_info)
+        return token_infos